@@ -0,0 +1,53 @@
+# Appwrite Indexes for Backend
+# Creates the indexes behind every filter the API applies.
+# Run once per database: python appwrite_indexes.py (existing ones are skipped)
+
+from appwrite.client import Client
+from appwrite.services.databases import Databases
+from appwrite.exception import AppwriteException
+
+from appwrite_config import (
+    APPWRITE_ENDPOINT,
+    APPWRITE_PROJECT_ID,
+    APPWRITE_DATABASE_ID,
+    APPWRITE_API_KEY,
+    COLLECTIONS
+)
+
+# (collection, index key, attributes) - without these Appwrite scans the
+# whole collection for each Query.equal filter
+INDEXES = [
+    ("teams", "idx_sport", ["sport"]),
+    ("matches", "idx_sport_status", ["sport", "status"]),  # also serves sport-only filters
+    ("matches", "idx_status", ["status"]),
+    ("achievements", "idx_match_id_player_name", ["match_id", "player_name"]),  # also serves match-only filters
+    ("achievements", "idx_player_name", ["player_name"]),
+]
+
+
+def create_indexes():
+    client = Client()
+    client.set_endpoint(APPWRITE_ENDPOINT)
+    client.set_project(APPWRITE_PROJECT_ID)
+    client.set_key(APPWRITE_API_KEY)
+    databases = Databases(client)
+
+    for collection, key, attributes in INDEXES:
+        try:
+            databases.create_index(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTIONS[collection],
+                key=key,
+                type="key",
+                attributes=attributes
+            )
+            print(f"✅ Created index {collection}.{key}")
+        except AppwriteException as e:
+            if e.code == 409:
+                print(f"⏭️  Index {collection}.{key} already exists")
+            else:
+                raise
+
+
+if __name__ == "__main__":
+    create_indexes()
@@ -1,12 +1,28 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import json
+from typing import List, Literal, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
+import functools
+import itertools
+import threading
+import time
+
+import anyio.to_thread
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
 
 # Appwrite SDK
+import appwrite.client
 from appwrite.client import Client
+from appwrite.exception import AppwriteException
 from appwrite.services.databases import Databases
 from appwrite.id import ID
 from appwrite.query import Query
@@ -31,13 +47,74 @@ client.set_key(APPWRITE_API_KEY)  # API key for server-side operations
 
 databases = Databases(client)
 
+
+def as_dict(document) -> dict:
+    """Flatten an SDK Document into the plain dict Appwrite sends.
+
+    The SDK wraps every document in a model that keeps user attributes in
+    `.data`; the handlers read them alongside "$id" as one dict.
+    """
+    return {"$id": document.id, **document.data}
+
+# Every Appwrite call is a blocking HTTPS request run in the threadpool and
+# spends almost all of its time waiting on the network, so allow more of
+# them in flight than AnyIO's default of 40 threads.
+THREADPOOL_SIZE = 100
+
+# The SDK sends every call through the module-level requests.request, which
+# opens a new connection (and TLS handshake) each time. Routing it through one
+# pooled Session keeps connections to Appwrite alive between calls; the pool
+# holds one connection per threadpool worker. This relies on Client.call
+# using nothing else from requests, which is why appwrite is pinned in
+# requirements.txt - recheck it before upgrading the SDK.
+# (connect, read) seconds; the SDK never passes a timeout, and without one a
+# hung Appwrite call would hold its worker thread - and shutdown - forever
+APPWRITE_TIMEOUT = (5, 30)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies APPWRITE_TIMEOUT when the caller sets none"""
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or APPWRITE_TIMEOUT, **kwargs)
+
+
+appwrite_session = requests.Session()
+appwrite_session.mount("https://", TimeoutHTTPAdapter(pool_connections=1, pool_maxsize=THREADPOOL_SIZE))
+appwrite_session.mount("http://", TimeoutHTTPAdapter(pool_connections=1, pool_maxsize=THREADPOOL_SIZE))
+appwrite.client.requests = appwrite_session
+
+
 # =============================================================================
 # FASTAPI APP SETUP
 # =============================================================================
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    writer = asyncio.create_task(write_live_scores())
+    # Only warms a cache update_score fills on demand, so it must not hold up
+    # startup if Appwrite is slow or unreachable
+    prefetch = asyncio.create_task(run_in_threadpool(prefetch_live_matches))
+    yield
+    prefetch.cancel()
+    # Flush whatever is still queued before the process exits, but don't let
+    # a stalled Appwrite keep it from exiting
+    try:
+        await asyncio.wait_for(stop_live_score_writer(writer), timeout=SHUTDOWN_FLUSH_TIMEOUT)
+    except asyncio.TimeoutError:
+        writer.cancel()
+        dropped = 0
+        while not live_score_queue.empty():
+            dropped += live_score_queue.get_nowait() is not None
+        print(f"Warning: live_score flush timed out, dropped {dropped} queued entries")
+    appwrite_session.close()
+
+
 app = FastAPI(
     title="Sports Arena API - Appwrite Edition",
-    description="Multi-sport live scoring platform connected to Appwrite"
+    description="Multi-sport live scoring platform connected to Appwrite",
+    lifespan=lifespan
 )
 
 # CORS Setup
@@ -49,10 +126,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# List endpoints return whole collections; small bodies aren't worth compressing
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
+
+def json_response(content) -> Response:
+    """Encode already JSON-safe content with orjson, skipping jsonable_encoder"""
+    return Response(content=orjson.dumps(content), media_type="application/json")
+
 # =============================================================================
 # PYDANTIC MODELS
 # =============================================================================
 
+# Every status this API writes to a match document
+MatchStatus = Literal["UPCOMING", "LIVE", "COMPLETED"]
+
+
 class PlayerInfo(BaseModel):
     name: str
     age: Optional[int] = None
@@ -96,32 +185,258 @@ class AchievementCreate(BaseModel):
     description: str
 
 
+# =============================================================================
+# IN-PROCESS CACHE
+# =============================================================================
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    A value loaded from Appwrite can be older than an invalidate() that ran
+    while it was loading. Loaders take a generation() before reading and pass
+    it to set(), which drops the value if the key was invalidated since.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 512):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        # Invalidation count per key; _epoch moves on when the counts reset
+        self._generations: dict = {}
+        self._epoch = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def generation(self, key):
+        """Token for set(), taken before loading the value for `key`"""
+        with self._lock:
+            return (self._epoch, self._generations.get(key, 0))
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when no key is given"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+                self._generations.clear()
+                self._epoch += 1
+            else:
+                self._data.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+                if len(self._generations) > 4 * self.maxsize:
+                    # Keep the counts bounded; the new epoch still voids
+                    # every token handed out before the reset
+                    self._generations.clear()
+                    self._epoch += 1
+
+
+# Team documents change only on registration (stats are edited in the
+# console), so a short TTL bounds staleness from outside edits.
+team_cache = TTLCache(ttl=60)
+
+# Encoded get_match payloads. Every endpoint that writes a match drops its
+# entry; the TTL only covers edits made outside this API.
+match_cache = TTLCache(ttl=30)
+
+# Encoded get_achievements payloads keyed by (match_id, player_name);
+# cleared whenever an achievement is created
+achievement_cache = TTLCache(ttl=45)
+
+# Registration documents, cached only while they fit in one page.
+# Registrations are written by the frontend straight to Appwrite, never
+# through this API, so only the TTL keeps them fresh.
+registration_cache = TTLCache(ttl=60, maxsize=1)
+
+# (team1_id, team2_id) per match. A match never changes sides, so once known
+# update_score can pick the scoring team without reading the match first.
+match_sides = TTLCache(ttl=6 * 3600, maxsize=1024)
+
+
+# =============================================================================
+# RATE LIMITING
+# =============================================================================
+
+class RateLimiter:
+    """Fixed-window counter allowing `limit` hits per key every `window` seconds.
+
+    Only touched from async dependencies on the event loop, so it needs no lock.
+    """
+
+    def __init__(self, limit: int, window: float, maxsize: int = 4096):
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self._windows: dict = {}
+
+    def hit(self, key) -> bool:
+        now = time.monotonic()
+        started, count = self._windows.get(key, (now, 0))
+        if now - started >= self.window:
+            started, count = now, 0
+        if count >= self.limit:
+            return False
+        if key not in self._windows and len(self._windows) >= self.maxsize:
+            self._windows = {
+                k: v for k, v in self._windows.items() if now - v[0] < self.window
+            }
+        self._windows[key] = (started, count + 1)
+        return True
+
+
+def rate_limit(limiter: RateLimiter):
+    """Dependency rejecting a client that exceeds `limiter` for one match"""
+    async def check(match_id: str, request: Request):
+        client_host = request.client.host if request.client else ""
+        if not limiter.hit((match_id, client_host)):
+            raise HTTPException(status_code=429, detail="Too many requests")
+    return Depends(check)
+
+
+# A retrying or stuck scorer UI would otherwise turn every repeat into three
+# Appwrite writes and a broadcast
+score_limiter = RateLimiter(limit=10, window=1)
+end_limiter = RateLimiter(limit=3, window=10)
+
+
+# =============================================================================
+# PAGED LISTS
+# =============================================================================
+
+# Documents fetched per Appwrite call when walking a whole collection
+PAGE_SIZE = 100
+
+
+def iter_pages(collection_id: str, queries: list):
+    """Yield pages of documents, following Appwrite's cursor pagination"""
+    after = None
+    while True:
+        page_queries = [*queries, Query.limit(PAGE_SIZE)]
+        if after:
+            page_queries.append(Query.cursor_after(after))
+        response = databases.list_documents(
+            database_id=APPWRITE_DATABASE_ID,
+            collection_id=collection_id,
+            queries=page_queries
+        )
+        documents = [as_dict(doc) for doc in response.documents]
+        yield documents
+        if len(documents) < PAGE_SIZE:
+            return
+        after = documents[-1]["$id"]
+
+
+def stream_json_list(pages, to_row):
+    """Encode `to_row(doc)` for every document as one JSON array, a page at a time"""
+    yield b"["
+    separator = b""
+    for page in pages:
+        if page:
+            yield separator + b",".join(orjson.dumps(to_row(doc)) for doc in page)
+            separator = b","
+    yield b"]"
+
+
 # =============================================================================
 # WEBSOCKET MANAGER FOR LIVE UPDATES
 # =============================================================================
 
+# Frames a single client may lag behind before it is dropped
+CLIENT_QUEUE_SIZE = 64
+
+
 class ConnectionManager:
+    """Fans each broadcast out through per-client queues.
+
+    Every socket gets its own queue and relay task, so a slow client only
+    delays itself and a broadcast is one encode plus N non-blocking puts.
+    """
+
     def __init__(self):
-        self.active_connections: dict[str, List[WebSocket]] = {}
+        # match_id -> {websocket: outbound frame queue}
+        self.active_connections: dict[str, dict[WebSocket, asyncio.Queue]] = {}
+        self.relays: dict[WebSocket, asyncio.Task] = {}
+        self.closing: set[asyncio.Task] = set()
 
     async def connect(self, websocket: WebSocket, match_id: str):
         await websocket.accept()
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
         if match_id not in self.active_connections:
-            self.active_connections[match_id] = []
-        self.active_connections[match_id].append(websocket)
+            self.active_connections[match_id] = {}
+        self.active_connections[match_id][websocket] = queue
+        self.relays[websocket] = asyncio.create_task(
+            self._relay(websocket, queue, match_id)
+        )
 
     def disconnect(self, websocket: WebSocket, match_id: str):
-        if match_id in self.active_connections:
-            if websocket in self.active_connections[match_id]:
-                self.active_connections[match_id].remove(websocket)
+        queues = self.active_connections.get(match_id)
+        if queues is not None:
+            queues.pop(websocket, None)
+            if not queues:
+                # Free the entry once the last viewer of a match leaves
+                del self.active_connections[match_id]
+        relay = self.relays.pop(websocket, None)
+        if relay is not None and relay is not asyncio.current_task():
+            relay.cancel()
+
+    async def _relay(self, websocket: WebSocket, queue: asyncio.Queue, match_id: str):
+        """Forward queued frames to one client until it goes away"""
+        try:
+            while True:
+                frame = await queue.get()
+                await websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error sending message: {e}")
+            self.disconnect(websocket, match_id)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)  # "try again later"
+        except Exception:
+            pass
+
+    def send(self, websocket: WebSocket, match_id: str, frame: str):
+        """Queue an already-encoded frame for one client"""
+        queue = self.active_connections.get(match_id, {}).get(websocket)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Client can't keep up; close it so it reconnects and resyncs
+            print("Dropping slow websocket client")
+            self.disconnect(websocket, match_id)
+            task = asyncio.create_task(self._close(websocket))
+            self.closing.add(task)
+            task.add_done_callback(self.closing.discard)
 
     async def broadcast(self, message: dict, match_id: str):
-        if match_id in self.active_connections:
-            for connection in self.active_connections[match_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"Error sending message: {e}")
+        queues = self.active_connections.get(match_id)
+        if not queues:
+            return
+        frame = orjson.dumps(message).decode()  # encoded once for every client
+        for websocket in list(queues):
+            self.send(websocket, match_id, frame)
 
 
 manager = ConnectionManager()
@@ -131,27 +446,39 @@ manager = ConnectionManager()
 # HEALTH CHECK
 # =============================================================================
 
+# Static, so encoded once at import instead of rebuilt on every health probe
+ROOT_INFO = orjson.dumps({
+    "message": "Sports Arena API - Appwrite Edition",
+    "status": "running",
+    "database": "Appwrite",
+    "endpoints": [
+        "/api/teams",
+        "/api/teams/register",
+        "/api/matches",
+        "/api/matches/create",
+        "/api/matches/{match_id}/score",
+        "/api/achievements"
+    ]
+})
+
+
 @app.get("/")
-def root():
-    return {
-        "message": "Sports Arena API - Appwrite Edition",
-        "status": "running",
-        "database": "Appwrite",
-        "endpoints": [
-            "/api/teams",
-            "/api/teams/register",
-            "/api/matches",
-            "/api/matches/create",
-            "/api/matches/{match_id}/score",
-            "/api/achievements"
-        ]
-    }
+async def root():
+    # async: nothing blocks here, so skip the threadpool hop
+    return Response(content=ROOT_INFO, media_type="application/json")
 
 
 # =============================================================================
 # TEAM ENDPOINTS
 # =============================================================================
 
+# Attributes read when listing teams; Query.select keeps Appwrite from
+# returning the rest of each document.
+TEAM_ATTRIBUTES = [
+    "$id", "name", "sport", "captain", "players",
+    "wins", "losses", "matches_played", "points"
+]
+
 @app.post("/api/teams/register")
 @app.post("/api/teams")
 def register_team(team: SimpleTeamCreate):
@@ -198,9 +525,10 @@ def register_team(team: SimpleTeamCreate):
                 "created_at": datetime.now().isoformat()
             }
         )
+        team_cache.invalidate()
         
         return {
-            "id": response["$id"],
+            "id": response.id,
             "message": f"{team.sport.title()} team '{team.name}' registered successfully!"
         }
         
@@ -212,19 +540,20 @@ def register_team(team: SimpleTeamCreate):
 @app.get("/api/teams")
 def get_teams(sport: Optional[str] = None):
     """Get all teams from Appwrite"""
+    cache_key = f"list:{sport or '*'}"
+    cached = team_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached)
+    
     try:
-        queries = []
+        queries = [Query.select(TEAM_ATTRIBUTES)]
         if sport:
             queries.append(Query.equal("sport", sport))
         
-        response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTIONS["teams"],
-            queries=queries
-        )
-        
+        # Walk every page: a single list call stops at Appwrite's default limit
+        generation = team_cache.generation(cache_key)
         teams = []
-        for doc in response["documents"]:
+        for doc in itertools.chain.from_iterable(iter_pages(COLLECTIONS["teams"], queries)):
             teams.append({
                 "id": doc["$id"],
                 "name": doc.get("name", ""),
@@ -237,7 +566,11 @@ def get_teams(sport: Optional[str] = None):
                 "points": doc.get("points", 0)
             })
         
-        return teams
+        team_cache.set(cache_key, teams, generation)
+        
+        # Rows come straight from Appwrite and are already JSON-safe, so skip
+        # FastAPI's jsonable_encoder walk and hand the list to orjson directly.
+        return json_response(teams)
         
     except Exception as e:
         print(f"Error fetching teams: {e}")
@@ -247,14 +580,19 @@ def get_teams(sport: Optional[str] = None):
 @app.get("/api/teams/{team_id}")
 def get_team(team_id: str):
     """Get a specific team by ID"""
+    cached = team_cache.get(team_id)
+    if cached is not None:
+        return json_response(cached)
+    
     try:
-        response = databases.get_document(
+        generation = team_cache.generation(team_id)
+        response = as_dict(databases.get_document(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTIONS["teams"],
             document_id=team_id
-        )
+        ))
         
-        return {
+        team = {
             "id": response["$id"],
             "name": response.get("name", ""),
             "sport": response.get("sport", "cricket"),
@@ -265,6 +603,9 @@ def get_team(team_id: str):
             "matches_played": response.get("matches_played", 0),
             "points": response.get("points", 0)
         }
+        team_cache.set(team_id, team, generation)
+        
+        return json_response(team)
         
     except Exception as e:
         print(f"Error fetching team: {e}")
@@ -275,6 +616,21 @@ def get_team(team_id: str):
 # MATCH ENDPOINTS
 # =============================================================================
 
+# Attributes shown in the match list (overs, umpire, etc. are detail-only)
+MATCH_LIST_ATTRIBUTES = [
+    "$id", "sport", "team1_id", "team2_id", "team1_name", "team2_name",
+    "venue", "status", "team1_score", "team1_wickets",
+    "team2_score", "team2_wickets", "result"
+]
+
+# Attributes shown on the match page (admin/umpire names are never returned)
+MATCH_DETAIL_ATTRIBUTES = [
+    "$id", "sport", "team1_id", "team2_id", "team1_name", "team2_name",
+    "team1_score", "team1_wickets", "team1_overs",
+    "team2_score", "team2_wickets", "team2_overs",
+    "venue", "status", "current_innings", "total_overs", "result"
+]
+
 @app.post("/api/matches/create")
 @app.post("/api/matches")
 def create_match(match: MatchCreate):
@@ -306,11 +662,12 @@ def create_match(match: MatchCreate):
                 "created_at": datetime.now().isoformat()
             }
         )
+        match_sides.set(response.id, (match.team1_id, match.team2_id))
         
         return {
-            "id": response["$id"],
+            "id": response.id,
             "message": f"Match created: {match.team1_name} vs {match.team2_name}",
-            "match_id": response["$id"]
+            "match_id": response.id
         }
         
     except Exception as e:
@@ -318,98 +675,120 @@ def create_match(match: MatchCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def match_summary(doc: dict) -> dict:
+    """Shape a match document for the match list"""
+    return {
+        "id": doc["$id"],
+        "sport": doc.get("sport", "cricket"),
+        "team1_id": doc.get("team1_id", ""),
+        "team2_id": doc.get("team2_id", ""),
+        "team1_name": doc.get("team1_name", "Team 1"),
+        "team2_name": doc.get("team2_name", "Team 2"),
+        "venue": doc.get("venue", ""),
+        "status": doc.get("status", "UPCOMING"),
+        "team1_score": doc.get("team1_score", 0),
+        "team1_wickets": doc.get("team1_wickets", 0),
+        "team2_score": doc.get("team2_score", 0),
+        "team2_wickets": doc.get("team2_wickets", 0),
+        "result": doc.get("result", ""),
+        "score_summary": f"{doc.get('team1_score', 0)}/{doc.get('team1_wickets', 0)}"
+    }
+
+
 @app.get("/api/matches")
-def get_matches(sport: Optional[str] = None, status: Optional[str] = None):
+def get_matches(sport: Optional[str] = None, status: Optional[MatchStatus] = None):
     """Get all matches from Appwrite"""
     try:
-        queries = []
+        queries = [Query.select(MATCH_LIST_ATTRIBUTES)]
         if sport:
             queries.append(Query.equal("sport", sport))
         if status:
             queries.append(Query.equal("status", status))
         
-        response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTIONS["matches"],
-            queries=queries
-        )
-        
-        matches = []
-        for doc in response["documents"]:
-            matches.append({
-                "id": doc["$id"],
-                "sport": doc.get("sport", "cricket"),
-                "team1_id": doc.get("team1_id", ""),
-                "team2_id": doc.get("team2_id", ""),
-                "team1_name": doc.get("team1_name", "Team 1"),
-                "team2_name": doc.get("team2_name", "Team 2"),
-                "venue": doc.get("venue", ""),
-                "status": doc.get("status", "UPCOMING"),
-                "team1_score": doc.get("team1_score", 0),
-                "team1_wickets": doc.get("team1_wickets", 0),
-                "team2_score": doc.get("team2_score", 0),
-                "team2_wickets": doc.get("team2_wickets", 0),
-                "result": doc.get("result", ""),
-                "score_summary": f"{doc.get('team1_score', 0)}/{doc.get('team1_wickets', 0)}"
-            })
-        
-        return matches
+        # Fetch the first page up front so Appwrite errors still become a 500
+        pages = iter_pages(COLLECTIONS["matches"], queries)
+        first_page = next(pages)
         
     except Exception as e:
         print(f"Error fetching matches: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    # Team names are copied onto the match document in create_match, so
+    # the list is built without any per-match team lookups. Rows are encoded
+    # and sent a page at a time instead of materialising the whole list.
+    return StreamingResponse(
+        stream_json_list(itertools.chain([first_page], pages), match_summary),
+        media_type="application/json"
+    )
+
+
+def load_match_details(match_id: str) -> bytes:
+    """Encoded match details, served from match_cache when possible"""
+    cached = match_cache.get(match_id)
+    if cached is not None:
+        return cached
+    
+    # Taken before the read so a score written meanwhile isn't cached over
+    generation = match_cache.generation(match_id)
+    response = as_dict(databases.get_document(
+        database_id=APPWRITE_DATABASE_ID,
+        collection_id=COLLECTIONS["matches"],
+        document_id=match_id,
+        queries=[Query.select(MATCH_DETAIL_ATTRIBUTES)]
+    ))
+    
+    body = orjson.dumps({
+        "id": response["$id"],
+        "sport": response.get("sport", "cricket"),
+        "team1": {
+            "id": response.get("team1_id", ""),
+            "name": response.get("team1_name", "Team 1"),
+            "score": response.get("team1_score", 0),
+            "wickets": response.get("team1_wickets", 0),
+            "overs": response.get("team1_overs", 0)
+        },
+        "team2": {
+            "id": response.get("team2_id", ""),
+            "name": response.get("team2_name", "Team 2"),
+            "score": response.get("team2_score", 0),
+            "wickets": response.get("team2_wickets", 0),
+            "overs": response.get("team2_overs", 0)
+        },
+        "venue": response.get("venue", ""),
+        "status": response.get("status", "UPCOMING"),
+        "current_innings": response.get("current_innings", 1),
+        "total_overs": response.get("total_overs", 20),
+        "result": response.get("result", ""),
+        "is_admin": True
+    })
+    match_cache.set(match_id, body, generation)
+    return body
 
 
 @app.get("/api/matches/{match_id}")
 def get_match(match_id: str):
     """Get match details by ID"""
     try:
-        response = databases.get_document(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTIONS["matches"],
-            document_id=match_id
-        )
-        
-        return {
-            "id": response["$id"],
-            "sport": response.get("sport", "cricket"),
-            "team1": {
-                "id": response.get("team1_id", ""),
-                "name": response.get("team1_name", "Team 1"),
-                "score": response.get("team1_score", 0),
-                "wickets": response.get("team1_wickets", 0),
-                "overs": response.get("team1_overs", 0)
-            },
-            "team2": {
-                "id": response.get("team2_id", ""),
-                "name": response.get("team2_name", "Team 2"),
-                "score": response.get("team2_score", 0),
-                "wickets": response.get("team2_wickets", 0),
-                "overs": response.get("team2_overs", 0)
-            },
-            "venue": response.get("venue", ""),
-            "status": response.get("status", "UPCOMING"),
-            "current_innings": response.get("current_innings", 1),
-            "total_overs": response.get("total_overs", 20),
-            "result": response.get("result", ""),
-            "is_admin": True
-        }
-        
+        body = load_match_details(match_id)
     except Exception as e:
         print(f"Error fetching match: {e}")
         raise HTTPException(status_code=404, detail="Match not found")
+    
+    return Response(content=body, media_type="application/json")
 
 
 @app.post("/api/matches/{match_id}/start")
 def start_match(match_id: str):
     """Start a match"""
     try:
-        response = databases.update_document(
+        response = as_dict(databases.update_document(
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTIONS["matches"],
             document_id=match_id,
             data={"status": "LIVE"}
-        )
+        ))
+        match_cache.invalidate(match_id)
+        match_sides.set(match_id, (response.get("team1_id"), response.get("team2_id")))
         
         return {"message": "Match started", "status": "LIVE"}
         
@@ -422,59 +801,234 @@ def start_match(match_id: str):
 # LIVE SCORE ENDPOINTS
 # =============================================================================
 
-@app.post("/api/matches/{match_id}/score")
-@app.put("/api/matches/{match_id}/score")
-async def update_score(match_id: str, score: ScoreUpdate):
-    """Update match score in Appwrite and broadcast to WebSocket clients"""
+# All update_score needs from the match: which side scored and the counters
+# it reports back when a request leaves one of them unchanged
+SCORE_ATTRIBUTES = [
+    "$id", "team1_id", "team2_id",
+    "team1_score", "team1_wickets", "team1_overs",
+    "team2_score", "team2_wickets", "team2_overs"
+]
+
+
+def prefetch_live_matches():
+    """Load the sides of every LIVE match so their first score skips a read"""
+    queries = [Query.equal("status", "LIVE"), Query.select(["$id", "team1_id", "team2_id"])]
     try:
-        # Get current match data
-        match = databases.get_document(
+        for page in iter_pages(COLLECTIONS["matches"], queries):
+            for doc in page:
+                match_sides.set(doc["$id"], (doc.get("team1_id"), doc.get("team2_id")))
+    except Exception as e:
+        print(f"Warning: Could not prefetch live matches: {e}")
+
+
+def increment_attribute(collection_id: str, document_id: str, attribute: str, value: int,
+                        transaction_id: Optional[str] = None):
+    """Atomically add `value` (may be negative) to a numeric attribute.
+
+    Decrements are bounded at zero by Appwrite itself, so a correction larger
+    than the current count fails instead of leaving a negative score.
+    """
+    if value < 0:
+        return databases.decrement_document_attribute(
             database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTIONS["matches"],
-            document_id=match_id
+            collection_id=collection_id,
+            document_id=document_id,
+            attribute=attribute,
+            value=-value,
+            min=0,
+            transaction_id=transaction_id
         )
-        
-        # Determine which team to update
-        update_data = {}
-        if score.team_id == match.get("team1_id"):
-            update_data = {
-                "team1_score": match.get("team1_score", 0) + score.runs,
-                "team1_wickets": match.get("team1_wickets", 0) + score.wickets,
-                "team1_overs": score.overs if score.overs else match.get("team1_overs", 0)
-            }
-        else:
-            update_data = {
-                "team2_score": match.get("team2_score", 0) + score.runs,
-                "team2_wickets": match.get("team2_wickets", 0) + score.wickets,
-                "team2_overs": score.overs if score.overs else match.get("team2_overs", 0)
-            }
-        
-        # Update in Appwrite
-        response = databases.update_document(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTIONS["matches"],
-            document_id=match_id,
-            data=update_data
+    return databases.increment_document_attribute(
+        database_id=APPWRITE_DATABASE_ID,
+        collection_id=collection_id,
+        document_id=document_id,
+        attribute=attribute,
+        value=value,
+        transaction_id=transaction_id
+    )
+
+
+async def run_in_transaction(writes: list):
+    """Stage `writes` in one Appwrite transaction and commit them together.
+
+    Each write is called with a `transaction_id` keyword. If any of them (or
+    the commit) fails, the transaction is rolled back so none take effect.
+    """
+    transaction = await run_in_threadpool(databases.create_transaction)
+    transaction_id = transaction.id
+    try:
+        await asyncio.gather(*(
+            run_in_threadpool(write, transaction_id=transaction_id) for write in writes
+        ))
+        await run_in_threadpool(
+            databases.update_transaction, transaction_id=transaction_id, commit=True
         )
-        
-        # Also create a live_score entry for real-time tracking
+    except Exception:
+        try:
+            await run_in_threadpool(
+                databases.update_transaction, transaction_id=transaction_id, rollback=True
+            )
+        except Exception as e:
+            print(f"Warning: Could not roll back transaction {transaction_id}: {e}")
+        raise
+
+
+# live_scores entries waiting to be written; bounded so an Appwrite outage
+# can't grow memory without limit
+live_score_queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
+
+# Entries taken off the queue per pass of the writer
+LIVE_SCORE_BATCH_SIZE = 100
+
+# Seconds shutdown waits for the writer to drain the queue
+SHUTDOWN_FLUSH_TIMEOUT = 10
+
+
+def queue_live_score(match_id: str, score: ScoreUpdate):
+    """Queue a live_score entry for real-time tracking (best-effort)"""
+    try:
+        live_score_queue.put_nowait({
+            "match_id": match_id,
+            "team_id": score.team_id,
+            "runs": score.runs,
+            "wickets": score.wickets,
+            "overs": score.overs,
+            "action": score.action or "score_update",
+            "timestamp": datetime.now().isoformat()
+        })
+    except asyncio.QueueFull:
+        print("Warning: live_score queue full, dropping entry")
+
+
+def create_live_scores_singly(documents: list):
+    """Write entries one at a time so a rejected one doesn't take the rest"""
+    for document in documents:
+        data = dict(document)
+        document_id = data.pop("$id")
         try:
             databases.create_document(
                 database_id=APPWRITE_DATABASE_ID,
                 collection_id=COLLECTIONS["live_scores"],
-                document_id=ID.unique(),
-                data={
-                    "match_id": match_id,
-                    "team_id": score.team_id,
-                    "runs": score.runs,
-                    "wickets": score.wickets,
-                    "overs": score.overs,
-                    "action": score.action or "score_update",
-                    "timestamp": datetime.now().isoformat()
-                }
+                document_id=document_id,
+                data=data
             )
         except Exception as e:
-            print(f"Warning: Could not create live_score entry: {e}")
+            print(f"Warning: Could not create live_score entry {data}: {e}")
+
+
+async def write_live_scores():
+    """Write queued live_scores entries to Appwrite until a None arrives"""
+    while True:
+        batch = [await live_score_queue.get()]
+        while len(batch) < LIVE_SCORE_BATCH_SIZE and not live_score_queue.empty():
+            batch.append(live_score_queue.get_nowait())
+        
+        # One bulk request per batch instead of one round trip per entry
+        documents = [{"$id": ID.unique(), **data} for data in batch if data is not None]
+        if documents:
+            try:
+                await run_in_threadpool(
+                    databases.create_documents,
+                    database_id=APPWRITE_DATABASE_ID,
+                    collection_id=COLLECTIONS["live_scores"],
+                    documents=documents
+                )
+            except AppwriteException as e:
+                # A 4xx means Appwrite rejected some entry, so retry singly and
+                # lose only the bad ones. Network errors (no code) and 5xx are
+                # outages that a hundred more calls would only make worse.
+                if e.code and 400 <= e.code < 500:
+                    print(f"Warning: Bulk live_score write rejected, retrying singly: {e}")
+                    await run_in_threadpool(create_live_scores_singly, documents)
+                else:
+                    print(f"Warning: Dropping {len(documents)} live_score entries: {e}")
+            except Exception as e:
+                print(f"Warning: Dropping {len(documents)} live_score entries: {e}")
+        
+        if None in batch:
+            return
+
+
+async def stop_live_score_writer(writer: asyncio.Task):
+    """Queue the stop marker and wait for the writer to drain up to it"""
+    await live_score_queue.put(None)
+    await writer
+
+
+@app.post("/api/matches/{match_id}/score", dependencies=[rate_limit(score_limiter)])
+@app.put("/api/matches/{match_id}/score", dependencies=[rate_limit(score_limiter)])
+async def update_score(match_id: str, score: ScoreUpdate):
+    """Update match score in Appwrite and broadcast to WebSocket clients"""
+    # The Appwrite SDK is blocking, so every call below runs in the threadpool
+    # to keep the event loop free for websocket traffic.
+    try:
+        def read_match():
+            return as_dict(databases.get_document(
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTIONS["matches"],
+                document_id=match_id,
+                queries=[Query.select(SCORE_ATTRIBUTES)]
+            ))
+        
+        # Only an unknown match needs reading before the writes
+        match = None
+        sides = match_sides.get(match_id)
+        if sides is None:
+            match = await run_in_threadpool(read_match)
+            sides = (match.get("team1_id"), match.get("team2_id"))
+            match_sides.set(match_id, sides)
+        
+        # Determine which team to update
+        team = "team1" if score.team_id == sides[0] else "team2"
+        
+        # Counters are incremented server-side, so two scorers posting at the
+        # same time can't overwrite each other's runs or wickets. Several
+        # writes are committed as one transaction: a correction that would
+        # take a counter below zero must not leave the rest of the request
+        # applied, or the scorer's retry would count those runs twice.
+        writes = []
+        if score.runs:
+            writes.append(functools.partial(
+                increment_attribute, COLLECTIONS["matches"], match_id, f"{team}_score", score.runs
+            ))
+        if score.wickets:
+            writes.append(functools.partial(
+                increment_attribute, COLLECTIONS["matches"], match_id, f"{team}_wickets", score.wickets
+            ))
+        if score.overs:
+            writes.append(functools.partial(
+                databases.update_document,
+                database_id=APPWRITE_DATABASE_ID,
+                collection_id=COLLECTIONS["matches"],
+                document_id=match_id,
+                data={f"{team}_overs": score.overs}
+            ))
+        try:
+            if len(writes) == 1:
+                # The common single-attribute post is atomic on its own and
+                # returns the updated document
+                match = as_dict(await run_in_threadpool(writes[0]))
+            elif writes:
+                await run_in_transaction(writes)
+                # Staged writes don't return committed values, so read them once
+                match = await run_in_threadpool(read_match)
+            elif match is None:
+                match = await run_in_threadpool(read_match)
+        finally:
+            # Also after a failure: a write that errored on the way back may
+            # still have been applied
+            if writes:
+                match_cache.invalidate(match_id)
+        
+        update_data = {
+            f"{team}_score": match.get(f"{team}_score", 0),
+            f"{team}_wickets": match.get(f"{team}_wickets", 0),
+            f"{team}_overs": match.get(f"{team}_overs", 0)
+        }
+        
+        # The live_scores entry is an audit trail nobody waits on, so it is
+        # handed to the background writer instead of written inline
+        queue_live_score(match_id, score)
         
         # Broadcast to WebSocket clients
         await manager.broadcast({
@@ -486,21 +1040,23 @@ async def update_score(match_id: str, score: ScoreUpdate):
             "current_score": update_data
         }, match_id)
         
-        return {
+        # Plain JSON-safe values: skip jsonable_encoder on the hottest endpoint
+        return json_response({
             "message": "Score updated successfully",
             "score": update_data
-        }
+        })
         
     except Exception as e:
         print(f"Error updating score: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.post("/api/matches/{match_id}/end")
-def end_match(match_id: str, result: str = ""):
+@app.post("/api/matches/{match_id}/end", dependencies=[rate_limit(end_limiter)])
+async def end_match(match_id: str, result: str = ""):
     """End a match and set the result"""
     try:
-        response = databases.update_document(
+        await run_in_threadpool(
+            databases.update_document,
             database_id=APPWRITE_DATABASE_ID,
             collection_id=COLLECTIONS["matches"],
             document_id=match_id,
@@ -509,8 +1065,11 @@ def end_match(match_id: str, result: str = ""):
                 "result": result
             }
         )
+        # No await between these, so no request sees the match half-ended
+        match_cache.invalidate(match_id)
+        match_sides.invalidate(match_id)
         
-        return {"message": "Match ended", "result": result}
+        return json_response({"message": "Match ended", "result": result})
         
     except Exception as e:
         print(f"Error ending match: {e}")
@@ -537,9 +1096,10 @@ def create_achievement(achievement: AchievementCreate):
                 "created_at": datetime.now().isoformat()
             }
         )
+        achievement_cache.invalidate()
         
         return {
-            "id": response["$id"],
+            "id": response.id,
             "message": f"Achievement '{achievement.achievement_type}' awarded to {achievement.player_name}"
         }
         
@@ -548,24 +1108,33 @@ def create_achievement(achievement: AchievementCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# Attributes returned by get_achievements
+ACHIEVEMENT_ATTRIBUTES = [
+    "$id", "match_id", "player_name", "achievement_type", "description", "created_at"
+]
+
+
 @app.get("/api/achievements")
 def get_achievements(match_id: Optional[str] = None, player_name: Optional[str] = None):
     """Get achievements from Appwrite"""
+    cache_key = (match_id, player_name)
+    cached = achievement_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
     try:
-        queries = []
+        # Appwrite ANDs the filters; with both present they are answered by
+        # the compound (match_id, player_name) index
+        queries = [Query.select(ACHIEVEMENT_ATTRIBUTES)]
         if match_id:
             queries.append(Query.equal("match_id", match_id))
         if player_name:
             queries.append(Query.equal("player_name", player_name))
         
-        response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTIONS["achievements"],
-            queries=queries
-        )
-        
+        # Walk every page: a single list call stops at Appwrite's default limit
+        generation = achievement_cache.generation(cache_key)
         achievements = []
-        for doc in response["documents"]:
+        for doc in itertools.chain.from_iterable(iter_pages(COLLECTIONS["achievements"], queries)):
             achievements.append({
                 "id": doc["$id"],
                 "match_id": doc.get("match_id", ""),
@@ -575,7 +1144,11 @@ def get_achievements(match_id: Optional[str] = None, player_name: Optional[str]
                 "created_at": doc.get("created_at", "")
             })
         
-        return achievements
+        # Trusted Appwrite data: serialize directly, skipping jsonable_encoder
+        body = orjson.dumps(achievements)
+        achievement_cache.set(cache_key, body, generation)
+        
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
         print(f"Error fetching achievements: {e}")
@@ -586,33 +1159,48 @@ def get_achievements(match_id: Optional[str] = None, player_name: Optional[str]
 # REGISTRATIONS ENDPOINTS (for compatibility with frontend)
 # =============================================================================
 
+def registration_summary(doc: dict) -> dict:
+    """Shape a registration document for the frontend"""
+    return {
+        "id": doc["$id"],
+        "name": doc.get("name", ""),
+        "email": doc.get("email", ""),
+        "phone": doc.get("phone", ""),
+        "team_id": doc.get("team_id", ""),
+        "players_list": doc.get("players_list", []),
+        "captain": doc.get("captain", ""),
+        "status": doc.get("status", "pending")
+    }
+
+
 @app.get("/api/registrations")
 def get_registrations():
     """Get all registrations from Appwrite"""
-    try:
-        response = databases.list_documents(
-            database_id=APPWRITE_DATABASE_ID,
-            collection_id=COLLECTIONS["registrations"]
+    documents = registration_cache.get("all")
+    if documents is not None:
+        return Response(
+            content=b"".join(stream_json_list([documents], registration_summary)),
+            media_type="application/json"
         )
-        
-        registrations = []
-        for doc in response["documents"]:
-            registrations.append({
-                "id": doc["$id"],
-                "name": doc.get("name", ""),
-                "email": doc.get("email", ""),
-                "phone": doc.get("phone", ""),
-                "team_id": doc.get("team_id", ""),
-                "players_list": doc.get("players_list", []),
-                "captain": doc.get("captain", ""),
-                "status": doc.get("status", "pending")
-            })
-        
-        return registrations
+    
+    try:
+        generation = registration_cache.generation("all")
+        pages = iter_pages(COLLECTIONS["registrations"], [])
+        documents = next(pages)
         
     except Exception as e:
         print(f"Error fetching registrations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    # A single page is the whole list and safe to cache. Longer lists are
+    # always read fresh and sent a page at a time: a cached page followed by
+    # live ones could skip or repeat rows, or break on a deleted cursor.
+    if len(documents) < PAGE_SIZE:
+        registration_cache.set("all", documents, generation)
+    return StreamingResponse(
+        stream_json_list(itertools.chain([documents], pages), registration_summary),
+        media_type="application/json"
+    )
 
 
 # =============================================================================
@@ -622,12 +1210,26 @@ def get_registrations():
 @app.websocket("/ws/{match_id}")
 async def websocket_endpoint(websocket: WebSocket, match_id: str):
     await manager.connect(websocket, match_id)
+    
+    # Send the full state once on connect; after that the client only gets
+    # score_update deltas. The snapshot goes through the client's queue, so
+    # it can't overtake an update that was broadcast before it.
+    try:
+        details = await run_in_threadpool(load_match_details, match_id)
+        manager.send(websocket, match_id, '{"event":"snapshot","match":' + details.decode() + "}")
+    except Exception as e:
+        print(f"Error sending match snapshot: {e}")
+    
     try:
         while True:
             data = await websocket.receive_text()
             # Echo back or handle commands
             await websocket.send_json({"received": data})
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any exit - a binary frame, a failed echo - must release the relay
+        # task and queue, not only a clean disconnect
         manager.disconnect(websocket, match_id)
 
 
@@ -640,4 +1242,12 @@ if __name__ == "__main__":
     print("🚀 Starting Sports Arena API - Appwrite Edition")
     print(f"📡 Appwrite Endpoint: {APPWRITE_ENDPOINT}")
     print(f"📁 Database ID: {APPWRITE_DATABASE_ID}")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # One worker on purpose: websocket subscribers, caches and rate limits
+    # all live in this process, so extra workers would split them
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools"
+    )
\ No newline at end of file